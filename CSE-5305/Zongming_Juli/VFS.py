@@ -1,76 +1,196 @@
 # Virtual File System via Python Ver.2.0
 
+import bisect
+import mmap
+import sys
+from dataclasses import dataclass, field
+
+
+# Help text shown by display_operations, built once at import time
+_HELP_TEXT = """\
+Welcome to the Virtual File System. Here are the available commands:
+  register [username] [password]   - Register a new user
+  login [username] [password]      - Login as a user
+  logout                           - Logout from the current user
+  dir                              - List directories and files
+  create [filename]                - Create a new file
+  del [filename]                   - Delete a file
+  open [filename]                  - Open a file
+  close [filename]                 - Close a file
+  read [filename]                  - Read a file's content
+  write [filename] [content]       - Write content to a file
+  cd [dirname]                     - Change directory
+  md [dirname]                     - Make a new directory
+  rd [dirname]                     - Remove a directory
+  diskusage                        - Display disk usage
+  showfat                          - Show FAT table
+Type 'exit' to quit the program."""
+
+
+@dataclass(slots=True)
+class FileNode:
+    # A file entry in a directory. Its data lives on the virtual disk at the extent recorded in the FAT table.
+    path: str  # Absolute path within the owner's tree, fixed at creation since files never move
+
+
+@dataclass(slots=True)
+class DirNode:
+    # A directory entry, mapping the names it contains to FileNode or DirNode entries.
+    children: dict = field(default_factory=dict)
+
+
+class VirtualFileSystem:
+    __slots__ = (
+        "current_user", "root", "current_dir", "open_files", "path", "dir_stack", "disk_space", "_dv",
+        "fat_table", "next_free_space", "used_space", "free_extents", "free_starts", "free_ends",
+        "file_index", "_dispatch",
+    )
 
-class VirtualFileSystem:   
     def __init__(self):
         # Initialize a virtual file system instance, including user, root directory, current directory,
         # open files, path tracking, virtual disk space, FAT table and next free space pointer.
         self.current_user = None
         self.root = {}  # Root directory containing user directory entries
         self.current_dir = None
-        self.open_files = {}
+        self.open_files = set()  # (user, filename) keys of the files currently opened
         self.path = []  # To keep track of the current path
-        self.disk_space = bytearray(1024 * 1024)  # 1MB of virtual disk space
-        self.fat_table = {}  # FAT Table
+        self.dir_stack = []  # Directory entries along the current path, parallel to self.path
+        self.disk_space = mmap.mmap(-1, 1024 * 1024)  # 1MB of virtual disk space, zero-filled lazily by the OS
+        self._dv = memoryview(self.disk_space)  # Zero-copy view used for all reads and writes
+        self.fat_table = {}  # FAT Table: (user, filename) -> (start, end, end of reserved space)
         self.next_free_space = 0  # Pointer to the next free space on disk
+        self.used_space = 0  # Bytes currently allocated to files
+        self.free_extents = []  # Freed extents as (size, start), kept sorted for best-fit lookups
+        self.free_starts = {}  # start -> end of each freed extent, to merge it with its neighbours
+        self.free_ends = {}  # end -> start of each freed extent
+        self.file_index = {}  # (user, filename) -> (parent children dict, file entry), from any directory
+        # Command table: name -> (handler, number of arguments); None means extra arguments are ignored.
+        self._dispatch = {
+            "register": (self.register, 2),
+            "login": (self.login, 2),
+            "logout": (self.logout, None),
+            "dir": (self.dir, None),
+            "create": (self.create, 1),
+            "del": (self.delete, 1),
+            "open": (self.open, 1),
+            "close": (self.close, 1),
+            "read": (self.read, 1),
+            "write": (self.write, 2),
+            "cd": (self.cd, 1),
+            "md": (self.md, 1),
+            "rd": (self.rd, 1),
+            "diskusage": (self.display_disk_usage, None),
+            "showfat": (self.show_fat_table, None),
+        }
 
 
     def display_operations(self):
         # Displays the available commands to the user.
-        print("Welcome to the Virtual File System. Here are the available commands:")
-        print("  register [username] [password]   - Register a new user")
-        print("  login [username] [password]      - Login as a user")
-        print("  logout                           - Logout from the current user")
-        print("  dir                              - List directories and files")
-        print("  create [filename]                - Create a new file")
-        print("  del [filename]                   - Delete a file")
-        print("  open [filename]                  - Open a file")
-        print("  close [filename]                 - Close a file")
-        print("  read [filename]                  - Read a file's content")
-        print("  write [filename] [content]       - Write content to a file")
-        print("  cd [dirname]                     - Change directory")
-        print("  md [dirname]                     - Make a new directory")
-        print("  rd [dirname]                     - Remove a directory")
-        print("  diskusage                        - Display disk usage")
-        print("  showfat                          - Show FAT table")
-        print("Type 'exit' to quit the program.")
-
-    def _build_file_paths(self, current_dir, current_path=""):
-        # Full path to build file
-        file_paths = {}
-        for name, item in current_dir["children"].items():
-            path = current_path + "/" + name
-            if item["type"] == "file":
-                file_paths[name] = path
-            elif item["type"] == "dir":
-                file_paths.update(self._build_file_paths(item, path))
-        return file_paths
+        print(_HELP_TEXT)
 
     def show_fat_table(self):
         # Displays the file allocation table (FAT table), which shows the start and end positions of each file.
-        file_paths = self._build_file_paths(self.root[self.current_user]["FAT"])
-        print("FAT Table:")
-        for filename, (start, end) in self.fat_table.items():
-            path = file_paths.get(filename, "Unknown")
-            print(f"  {filename}:")
-            print(f"    Path: {path}")
-            print(f"    Start - {start}, End - {end}")
+        user, index = self.current_user, self.file_index
+        lines = ["FAT Table:"]
+        for (owner, filename), (start, end, _) in self.fat_table.items():
+            indexed = index.get((owner, filename)) if owner == user else None
+            path = indexed[1].path if indexed else "Unknown"
+            lines.append(f"  {filename}:")
+            lines.append(f"    Path: {path}")
+            lines.append(f"    Start - {start}, End - {end}")
+        sys.stdout.write("\n".join(lines) + "\n")
 
     def display_disk_usage(self):
         # Show current disk usage
-        used_space = sum(len(self.disk_space[start:end]) for start, end in self.fat_table.values())
-        total_space = len(self.disk_space)
-        print(f"Disk usage: {used_space}/{total_space} bytes")
+        print(f"Disk usage: {self.used_space}/{len(self.disk_space)} bytes")
+
+    def _allocate(self, size):
+        # Finds space for a file of the given size, reusing the smallest freed extent that fits
+        # before moving the next free space pointer. Returns None when the disk is full.
+        i = bisect.bisect_left(self.free_extents, (size, -1))
+        if i < len(self.free_extents):
+            extent_size, start = self.free_extents[i]
+            self._take_free(start)
+            if extent_size > size:  # give the unused remainder back to the free list
+                self._add_free(start + size, start + extent_size)
+            return start
+        if self.next_free_space + size > len(self.disk_space):
+            return None
+        start = self.next_free_space
+        self.next_free_space += size
+        return start
+
+    def _grow_in_place(self, end, new_end):
+        # Extends an allocation ending at end up to new_end, using the space right after it when
+        # that space is unallocated. Returns False when the allocation has to move instead.
+        if end == self.next_free_space:
+            if new_end > len(self.disk_space):
+                return False
+            self.next_free_space = new_end
+            return True
+        above_end = self.free_starts.get(end)
+        if above_end is None or above_end < new_end:
+            return False
+        self._take_free(end)
+        if above_end > new_end:
+            self._add_free(new_end, above_end)
+        return True
+
+    def _free(self, start, end):
+        # Releases an extent, merging it with any free space on either side. Freed space is never read,
+        # so it is not cleared.
+        if start == end:
+            return
+        if start in self.free_ends:
+            below_start = self.free_ends[start]
+            self._take_free(below_start)
+            start = below_start
+        if end in self.free_starts:
+            above_end = self.free_starts[end]
+            self._take_free(end)
+            end = above_end
+        if end == self.next_free_space:  # free space at the top is handed back to the pointer
+            self.next_free_space = start
+        else:
+            self._add_free(start, end)
+
+    def _free_span(self, start, end):
+        # Size of the free run that releasing the extent start..end would produce.
+        low = self.free_ends.get(start, start)
+        high = self.free_starts.get(end, end)
+        if high == self.next_free_space:
+            high = len(self.disk_space)
+        return high - low
+
+    def _add_free(self, start, end):
+        # Records a free extent in the size-ordered list and both neighbour maps.
+        self.free_starts[start] = end
+        self.free_ends[end] = start
+        bisect.insort(self.free_extents, (end - start, start))
+
+    def _take_free(self, start):
+        # Removes the free extent beginning at start from the free lists.
+        end = self.free_starts.pop(start)
+        del self.free_ends[end]
+        del self.free_extents[bisect.bisect_left(self.free_extents, (end - start, start))]
+
+    def _raw_write(self, offset, data):
+        # Copies a bytes-like object onto the virtual disk at offset. Assigning into the memoryview is a
+        # single memcpy done in C, with no intermediate object and no resizing of disk_space.
+        end = offset + len(data)
+        self._dv[offset:end] = data
+        return end
 
     def register(self, username, password):
         # Allows a new user to register in the system.
+        username = sys.intern(username)
         if username in self.root:
             return "User already exists."
         else:
             self.root[username] = {
                 "username": username,
                 "password": password,
-                "FAT": {"type": "dir", "children": {}}  # User File Allocation Table (FAT)
+                "FAT": DirNode()  # User File Allocation Table (FAT)
             }
             return f"User '{username}' registered successfully."
 
@@ -80,6 +200,7 @@ class VirtualFileSystem:
             self.current_user = username
             self.current_dir = self.root[username]["FAT"]  # Point to the user's FAT
             self.path = []
+            self.dir_stack = [self.current_dir]
             return f"User '{username}' logged in successfully."
         else:
             return "Login failed."
@@ -91,68 +212,107 @@ class VirtualFileSystem:
             self.current_user = None
             self.current_dir = None
             self.path = []
+            self.dir_stack = []
             return f"User '{user}' logged out successfully."
         else:
             return "No user currently logged in."
 
     def dir(self):
         # Lists the directories and files in the current directory.
-        return list(self.current_dir["children"].keys())
+        return list(self.current_dir.children.keys())
 
     def create(self, filename):
-        # Creates a new file in the current directory.
-        if filename not in self.current_dir["children"]:
-            self.current_dir["children"][filename] = {"content": "", "type": "file"}
-            self.fat_table[filename] = (self.next_free_space, self.next_free_space)  # initial allocation
-            return f"File '{filename}' created."
-        else:
+        # Creates a new file in the current directory. File names are unique within a user's tree.
+        filename = sys.intern(filename)
+        children, fat = self.current_dir.children, self.fat_table
+        key = (self.current_user, filename)
+        if key in self.file_index or filename in children:
             return "File already exists."
+        entry = children[filename] = FileNode("/" + "/".join(self.path + [filename]))
+        self.file_index[key] = (children, entry)
+        fat[key] = (self.next_free_space,) * 3  # initial allocation
+        return f"File '{filename}' created."
 
     def delete(self, filename):
-        # Deletes a file from the current directory.
-        if filename in self.current_dir["children"]:
-            del self.current_dir["children"][filename]
-            file_start, file_end = self.fat_table[filename]
-            self.disk_space[file_start:file_end] = bytearray(file_end - file_start)  # Clear data on disk
-            self.next_free_space = file_start  # Update the next free space pointer
-            del self.fat_table[filename]
-            self.show_fat_table()  
-            return f"File '{filename}' deleted."
-        else:
+        # Deletes a file of the current user, wherever it is in the user's tree.
+        key = (self.current_user, filename)
+        try:
+            parent, _ = self.file_index.pop(key)
+        except KeyError:
             return "File not found."
+        del parent[filename]
+        self._release_file(key)
+        self.show_fat_table()  
+        return f"File '{filename}' deleted."
+
+    def _release_file(self, key):
+        # Closes a removed file and gives its extent back to the disk.
+        self.open_files.discard(key)  # its bytes are about to be released
+        file_start, file_end, file_limit = self.fat_table.pop(key)
+        self.used_space -= file_end - file_start
+        self._free(file_start, file_limit)
 
     def open(self, filename):
         # Opens a file for reading or writing.
-        if filename in self.current_dir["children"] and filename not in self.open_files:
-            self.open_files[filename] = self.current_dir["children"][filename]
+        key = (self.current_user, filename)
+        if key in self.file_index and key not in self.open_files:
+            self.open_files.add(key)
             return f"File '{filename}' opened."
         else:
             return "File not found or already opened."
 
     def close(self, filename):
         # Closes an opened file.
-        if filename in self.open_files:
-            del self.open_files[filename]
+        key = (self.current_user, filename)
+        if key in self.open_files:
+            self.open_files.remove(key)
             return f"File '{filename}' closed."
         else:
             return "File not opened."
 
     def read(self, filename):
-        # Reads the content of an opened file.
-        if filename in self.open_files:
-            return self.open_files[filename]["content"]
+        # Reads the content of an opened file from its own extent on the virtual disk, via its per-user FAT entry.
+        key = (self.current_user, filename)
+        if key in self.open_files:
+            file_start, file_end, _ = self.fat_table[key]
+            return str(self._dv[file_start:file_end], "utf-8")
         else:
             return "File not opened."
 
     def write(self, filename, content):
         # Writes or appends content to an opened file.
-        if filename in self.open_files:
-            file_start, file_end = self.fat_table[filename]
-            new_end = min(file_end + len(content), len(self.disk_space))
-            self.disk_space[file_start:new_end] = content[:new_end - file_start].encode()
-            self.open_files[filename]["content"] += content
-            self.fat_table[filename] = (file_start, new_end)
-            self.next_free_space = new_end
+        key = (self.current_user, filename)
+        if key in self.open_files:
+            fat = self.fat_table
+            file_start, file_end, file_limit = fat[key]
+            data = content.encode()
+            if file_end + len(data) > file_limit:
+                if self._grow_in_place(file_limit, file_end + len(data)):
+                    file_limit = file_end + len(data)
+                else:
+                    # Move the file, reserving twice the space it needs so later appends fit without
+                    # another move. Falls back to the exact size when the disk is nearly full.
+                    size = file_end - file_start
+                    capacity = 2 * (size + len(data))
+                    new_start = self._allocate(capacity)
+                    if new_start is None:
+                        capacity = size + len(data)
+                        new_start = self._allocate(capacity)
+                    released = new_start is None
+                    if released:
+                        # The file only fits once its own extent is released. Freed bytes are not cleared
+                        # and the copy below is a memmove, so the new place may overlap the old one.
+                        if self._free_span(file_start, file_limit) < capacity:
+                            return "Not enough disk space."
+                        self._free(file_start, file_limit)
+                        new_start = self._allocate(capacity)
+                    new_file_end = self._raw_write(new_start, self._dv[file_start:file_end])
+                    if not released:
+                        self._free(file_start, file_limit)
+                    file_start, file_end, file_limit = new_start, new_file_end, new_start + capacity
+            new_end = self._raw_write(file_end, data)
+            fat[key] = (file_start, new_end, file_limit)
+            self.used_space += len(data)
             return "Content written to file."
         else:
             return "File not opened."
@@ -162,81 +322,88 @@ class VirtualFileSystem:
         if dirname == "..":
             if self.path:
                 self.path.pop()
-                self._update_current_dir()
+                self.dir_stack.pop()
+                self.current_dir = self.dir_stack[-1]
                 return "Returned to the parent directory."
             else:
                 return "Already at the root directory."
-        elif dirname in self.current_dir["children"] and self.current_dir["children"][dirname]["type"] == "dir":
+        try:
+            entry = self.current_dir.children[dirname]
+        except KeyError:
+            return "Directory not found."
+        if isinstance(entry, DirNode):
             self.path.append(dirname)
-            self._update_current_dir()
+            self.current_dir = entry
+            self.dir_stack.append(entry)
             return f"Changed directory to '{dirname}'."
         else:
             return "Directory not found."
 
-    def _update_current_dir(self):
-        # Update the current working directory based on the path.
-        self.current_dir = self.root[self.current_user]["FAT"]
-        for dir in self.path:
-            self.current_dir = self.current_dir["children"][dir]
-
     def rd(self, dirname):
         # Removes a directory from the current directory.
-        if dirname in self.current_dir["children"] and self.current_dir["children"][dirname]["type"] == "dir":
-            del self.current_dir["children"][dirname]
+        children = self.current_dir.children
+        try:
+            entry = children[dirname]
+        except KeyError:
+            return "Directory not found or is a file."
+        if isinstance(entry, DirNode):
+            self._release_files(entry)
+            del children[dirname]
             return f"Directory '{dirname}' deleted."
         else:
             return "Directory not found or is a file."
 
+    def _release_files(self, directory):
+        # Releases every file below a directory that is being removed, as delete does for one file.
+        user = self.current_user
+        for name, item in directory.children.items():
+            if isinstance(item, FileNode):
+                del self.file_index[(user, name)]
+                self._release_file((user, name))
+            else:
+                self._release_files(item)
+
     def md(self, dirname):
         # Creates a new directory in the current directory.
-        if dirname not in self.current_dir["children"]:
-            self.current_dir["children"][dirname] = {"type": "dir", "children": {}}
-            return f"Directory '{dirname}' created."
-        else:
+        dirname = sys.intern(dirname)
+        children = self.current_dir.children
+        if dirname in children:
             return "Directory already exists."
+        children[dirname] = DirNode()
+        return f"Directory '{dirname}' created."
 
     def process_command(self, command):
         # Processes a given command by calling the appropriate method.
-        args = command.split()
+        args = command.split(maxsplit=2)  # Write content stays in one piece, spacing included
         if not args:
             return "No command entered."
         cmd = args[0].lower()
-        
-        if cmd == "diskusage":
-            self.display_disk_usage()
-            return ""
-        elif cmd == "showfat":
-            self.show_fat_table()
-            return ""
-    
-        if cmd == "register" and len(args) == 3:
-            return self.register(args[1], args[2])
-        elif cmd == "login" and len(args) == 3:
-            return self.login(args[1], args[2])
-        elif cmd == "logout":
-            return self.logout()
-        elif cmd == "dir":
-            return self.dir()
-        elif cmd == "create" and len(args) == 2:
-            return self.create(args[1])
-        elif cmd == "del" and len(args) == 2:
-            return self.delete(args[1])
-        elif cmd == "open" and len(args) == 2:
-            return self.open(args[1])
-        elif cmd == "close" and len(args) == 2:
-            return self.close(args[1])
-        elif cmd == "read" and len(args) == 2:
-            return self.read(args[1])
-        elif cmd == "write" and len(args) >= 3:
-            return self.write(args[1], " ".join(args[2:]))
-        elif cmd == "cd" and len(args) == 2:
-            return self.cd(args[1])
-        elif cmd == "md" and len(args) == 2:
-            return self.md(args[1])
-        elif cmd == "rd" and len(args) == 2:
-            return self.rd(args[1])
-        else:
+        if cmd != "write" and len(args) == 3:
+            args[2:] = args[2].split()
+        if len(args) > 1:
+            # Names are interned like the stored keys, so entry lookups can match by identity
+            args[1] = sys.intern(args[1])
+
+        spec = self._dispatch.get(cmd)
+        if spec is None:
             return "Invalid command or incorrect number of arguments."
+        handler, arg_count = spec
+        if arg_count is None:
+            response = handler()
+            return "" if response is None else response
+        elif len(args) - 1 == arg_count:
+            return handler(*args[1:])
+        return "Invalid command or incorrect number of arguments."
+
+
+def read_commands():
+    # Prompts for commands on a terminal; piped or redirected input is read line by line without prompts.
+    if sys.stdin.isatty():
+        while True:
+            yield input("> ")
+    else:
+        for line in sys.stdin:
+            yield line.rstrip("\n")
 
 
 # Create an instance of the VirtualFileSystem
@@ -246,8 +413,7 @@ vfs = VirtualFileSystem()
 vfs.display_operations()
 
 # Main loop to process user commands
-while True:
-    command = input("> ")
+for command in read_commands():
     if command.lower() == "exit":
         break
     response = vfs.process_command(command)